@@ -2,10 +2,21 @@ import os
 import json
 import hashlib
 import re
+import asyncio
+from dataclasses import dataclass, fields, replace
 from datetime import datetime, timezone, date
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
 
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+import orjson
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer, Tag, UnicodeDammit
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
 CHAT_IDS = [c.strip() for c in os.environ["TELEGRAM_CHAT_IDS"].split(",") if c.strip()]
@@ -15,11 +26,19 @@ STATE_FILE = "state.json"
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; EditaisMonitor/1.0)"}
 
-# Meses PT-BR para "31 de janeiro de 2026"
+DETAIL_CONCURRENCY = 20
+PER_DOMAIN_CONCURRENCY = 4
+
+# Em extract_links só interessam os <a href>; o resto da página nem vira árvore
+_ANCHOR_STRAINER = SoupStrainer("a", href=True)
+
+# Tags cujo texto clean_text_from_soup ignora
+_SKIP_TAGS = {"script", "style", "noscript", "nav", "footer", "header", "aside"}
+
+# Meses PT-BR para "31 de janeiro de 2026" (chaves sem acento, ver _ACCENTS)
 PT_MONTHS = {
     "janeiro": 1,
     "fevereiro": 2,
-    "março": 3,
     "marco": 3,
     "abril": 4,
     "maio": 5,
@@ -32,6 +51,50 @@ PT_MONTHS = {
     "dezembro": 12,
 }
 
+# Remove acentos do nome do mês antes de procurar em PT_MONTHS ("março" -> "marco")
+_ACCENTS = str.maketrans("çãõéêíóôú", "caoeeioou")
+
+# Palavras-chave que marcam um link como candidato a edital (texto ou URL)
+KEYWORDS_RX = re.compile(
+    r"edital|chamamento|sele[cç][aã]o|oportunidade|retifica[cç][aã]o|prorroga[cç][aã]o"
+    r"|inscri[cç][aã]o|inscri[cç][oõ]es",
+    re.IGNORECASE,
+)
+
+# Regexes de prazo usadas em parse_deadlines (compiladas uma vez só)
+# Data perto de palavra-chave, numérica (d1/m1/y1) ou por extenso (d2 de mn de y2)
+KW_DATE_RX = re.compile(
+    r"(?P<kw>até|prazo|inscri|submiss|envio|entrega|encerr|data\s*limite|deadline)[^0-9]{0,60}"
+    r"(?:(?P<d1>\d{1,2})[\/\.-](?P<m1>\d{1,2})[\/\.-](?P<y1>\d{2,4})"
+    r"|(?P<d2>\d{1,2})\s+de\s+(?P<mn>[a-zçãõéêíóôú]+)\s+de\s+(?P<y2>\d{4}))",
+    re.IGNORECASE,
+)
+ANY_NUM_RX = re.compile(r"(\d{1,2})[\/\.-](\d{1,2})[\/\.-](\d{2,4})")
+
+
+class Item(NamedTuple):
+    """Linha da mensagem do Telegram: fonte, título e link."""
+    source: str
+    title: str
+    link: str
+
+
+@dataclass(slots=True)
+class SourceState:
+    """Estado salvo de cada fonte em state.json (chave: URL da fonte)."""
+    fingerprint: Optional[str] = None
+    anchor_fp: Optional[str] = None
+    candidates_sig: Optional[str] = None
+    checked_at: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SourceState":
+        # Ignora chaves desconhecidas (state.json de versões antigas/novas)
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in d.items() if k in names})
+
 
 def load_sources():
     with open(SOURCES_FILE, "r", encoding="utf-8") as f:
@@ -41,27 +104,89 @@ def load_sources():
 def load_state():
     if not os.path.exists(STATE_FILE):
         return {"seen": {}}
-    with open(STATE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(STATE_FILE, "rb") as f:
+        state = orjson.loads(f.read())
+    state["seen"] = {url: SourceState.from_dict(d) for url, d in state.get("seen", {}).items()}
+    return state
 
 
 def save_state(state):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    # Escreve num arquivo temporário e troca de uma vez: se o processo cair no meio,
+    # o state.json anterior continua inteiro.
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    os.replace(tmp, STATE_FILE)
 
 
 def sha(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def fetch_page(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    return r.text
+def anchors_fingerprint(links) -> str:
+    """
+    Assinatura dos links da página (texto + href, em ordem canônica).
+    Não muda com banners, nonces e outros ruídos do HTML, só com os links.
+    """
+    data = "\n".join(f"{t}\t{h}" for (t, h) in sorted(links)).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def decode_html(body: bytes, charset: Optional[str] = None) -> str:
+    """
+    Decodifica o HTML sem nunca falhar: usa o charset do Content-Type se houver;
+    senão o <meta charset> da página, e por último detecção (utf-8/windows-1252).
+    """
+    known = [charset] if charset else []
+    return UnicodeDammit(body, known, is_html=True).unicode_markup
+
+
+async def fetch_page_async(session: aiohttp.ClientSession, url: str, prev_meta: Optional[SourceState] = None):
+    """
+    Baixa a página e retorna (html, fingerprint, validators).
+    O fingerprint é o SHA-256 dos bytes da resposta, sem recodificar o texto.
+    `validators` traz o ETag/Last-Modified da resposta; se `prev_meta` tiver os
+    da última execução, a requisição é condicional e um 304 retorna None.
+    """
+    headers = {}
+    if prev_meta:
+        if prev_meta.etag:
+            headers["If-None-Match"] = prev_meta.etag
+        if prev_meta.last_modified:
+            headers["If-Modified-Since"] = prev_meta.last_modified
+
+    async with session.get(url, headers=headers) as r:
+        if r.status == 304:
+            return None
+        r.raise_for_status()
+        body = await r.read()
+        fingerprint = hashlib.sha256(body).hexdigest()
+        validators = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+        return decode_html(body, r.charset), fingerprint, validators
+
+
+async def fetch_detail(session: aiohttp.ClientSession, url: str, sem: asyncio.Semaphore, domain_sems: dict) -> Optional[str]:
+    """
+    Baixa uma página de detalhe e retorna o HTML decodificado.
+    Conteúdo que não é HTML (PDF, .doc, imagens...) retorna None em vez de erro.
+    """
+    # No máximo PER_DOMAIN_CONCURRENCY requisições por domínio (pra não sobrecarregar
+    # os portais) e DETAIL_CONCURRENCY downloads de detalhes ao mesmo tempo no total.
+    domain_sem = domain_sems.setdefault(urlsplit(url).netloc, asyncio.Semaphore(PER_DOMAIN_CONCURRENCY))
+    async with domain_sem, sem:
+        async with session.get(url) as r:
+            r.raise_for_status()
+            ct = r.content_type
+            if "Content-Type" in r.headers and not (ct.startswith("text/") or "html" in ct or "xml" in ct):
+                return None
+            return decode_html(await r.read(), r.charset)
 
 
 def extract_links(html: str, base_url: str):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_ANCHOR_STRAINER)
     links = []
     for a in soup.find_all("a", href=True):
         href = a["href"].strip()
@@ -78,21 +203,58 @@ def extract_links(html: str, base_url: str):
     return links
 
 
-def tg_send(text: str):
+async def tg_send(session: aiohttp.ClientSession, text: str):
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    for chat_id in CHAT_IDS:
-        r = requests.post(
+
+    async def _post_one(chat_id):
+        async with session.post(
             url,
             json={"chat_id": chat_id, "text": text, "disable_web_page_preview": True},
-            timeout=30,
-        )
-        # Se der erro de token/chat_id, vai aparecer nos logs do Actions:
-        r.raise_for_status()
+        ) as r:
+            r.raise_for_status()
+
+    # Envia para todos os chats ao mesmo tempo, pela mesma sessão (keep-alive) das fontes
+    results = await asyncio.gather(*[_post_one(c) for c in CHAT_IDS], return_exceptions=True)
+    errors = [e for e in results if isinstance(e, BaseException)]
+    print(f"Telegram: enviado para {len(CHAT_IDS) - len(errors)}/{len(CHAT_IDS)} chats")
+    # Se der erro de token/chat_id, vai aparecer nos logs do Actions:
+    if errors:
+        raise errors[0]
+
 
+def _is_skipped(tag: Tag, stop: Tag) -> bool:
+    # True se `tag` (ou algum ancestral até `stop`) é menu, rodapé, script etc.
+    for node in (tag, *tag.parents):
+        if node is stop:
+            return False
+        if node.name in _SKIP_TAGS:
+            return True
+    return False
 
-def clean_text_from_html(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text(" ")
+
+def clean_text_from_soup(soup: BeautifulSoup) -> str:
+    """
+    Texto do conteúdo principal da página, sem menus, rodapés, scripts etc.
+    (datas de navegação atrapalham a detecção de prazo). Não altera `soup`.
+    """
+    # Prefere o conteúdo principal da página; se não houver, usa o <body> (ou o documento todo)
+    main = next(
+        (t for t in soup.find_all(["main", "article"]) if not _is_skipped(t, soup)),
+        None,
+    ) or soup.body or soup
+
+    # Percorre a árvore pulando os ramos descartados, sem removê-los do soup
+    parts = []
+    stack = [main]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if node is not main and node.name in _SKIP_TAGS:
+                continue
+            stack.extend(reversed(node.contents))
+        elif type(node) is NavigableString:
+            parts.append(node)
+    text = " ".join(parts)
     text = re.sub(r"\s+", " ", text)
     return text.strip()
 
@@ -105,33 +267,36 @@ def parse_deadlines(text: str):
       - prazo: 31-01-2026
       - inscrições até 31.01.2026
       - até 31 de janeiro de 2026
+    Datas perto de palavras-chave têm preferência: só se não houver nenhuma
+    é que o texto é varrido de novo atrás de qualquer data numérica.
     """
-    t = text.lower()
-
     found = []
 
-    # 1) Padrão com separadores numéricos (dd/mm/aaaa, dd-mm-aaaa, dd.mm.aaaa)
-    # Damos preferência quando aparece perto de palavras-chave.
-    kw = r"(até|prazo|inscri|submiss|envio|entrega|encerr|data\s*limite|deadline)"
-    rx_kw_num = re.compile(
-        rf"{kw}[^0-9]{{0,60}}(\d{{1,2}})[\/\.-](\d{{1,2}})[\/\.-](\d{{2,4}})"
-    )
-    for m in rx_kw_num.finditer(t):
-        d, mo, y = m.group(2), m.group(3), m.group(4)  # cuidado com grupos
-        # Na regex, grupos: kw (1), dia (2), mês (3), ano (4)
-        day_i = int(m.group(2))
-        mon_i = int(m.group(3))
-        year_i = int(m.group(4))
-        if year_i < 100:
-            year_i += 2000
+    # 1) Uma passada só: data numérica (dd/mm/aaaa, dd-mm-aaaa, dd.mm.aaaa)
+    # ou por extenso ("até 31 de janeiro de 2026") perto de palavra-chave
+    for m in KW_DATE_RX.finditer(text):
+        if m.group("d1"):
+            day_i = int(m.group("d1"))
+            mon_i = int(m.group("m1"))
+            year_i = int(m.group("y1"))
+            if year_i < 100:
+                year_i += 2000
+        else:
+            day_i = int(m.group("d2"))
+            mon_i = PT_MONTHS.get(m.group("mn").lower().translate(_ACCENTS))
+            year_i = int(m.group("y2"))
+            if not mon_i:
+                continue
         try:
             found.append(date(year_i, mon_i, day_i))
         except ValueError:
             pass
 
+    if found:
+        return found
+
     # 2) Caso não tenha achado com keyword, tenta pegar qualquer data numérica no texto
-    rx_any_num = re.compile(r"(\d{1,2})[\/\.-](\d{1,2})[\/\.-](\d{2,4})")
-    for m in rx_any_num.finditer(t):
+    for m in ANY_NUM_RX.finditer(text):
         day_i = int(m.group(1))
         mon_i = int(m.group(2))
         year_i = int(m.group(3))
@@ -142,23 +307,6 @@ def parse_deadlines(text: str):
         except ValueError:
             pass
 
-    # 3) Formato por extenso: "até 31 de janeiro de 2026"
-    rx_ext = re.compile(
-        r"(até|prazo|inscri|submiss|envio|entrega|encerr|data\s*limite|deadline)"
-        r"[^0-9]{0,60}(\d{1,2})\s+de\s+([a-zçãõéêíóôú]+)\s+de\s+(\d{4})"
-    )
-    for m in rx_ext.finditer(t):
-        day_i = int(m.group(2))
-        month_name = m.group(3).strip()
-        year_i = int(m.group(4))
-        mon_i = PT_MONTHS.get(month_name)
-        if not mon_i:
-            continue
-        try:
-            found.append(date(year_i, mon_i, day_i))
-        except ValueError:
-            pass
-
     return found
 
 
@@ -179,91 +327,149 @@ def is_expired(deadline: date) -> bool:
     return deadline < today
 
 
-def main():
-    sources = load_sources()
-    state = load_state()
-    seen = state.get("seen", {})
-
+async def check_source(session: aiohttp.ClientSession, s: dict, seen: dict, sem: asyncio.Semaphore, domain_sems: dict):
+    """
+    Checa uma fonte (página principal + páginas de detalhe dos candidatos).
+    Atualiza `seen` e retorna (itens novos, quantidade filtrada por prazo vencido).
+    """
+    name = s["name"]
+    url = s["url"]
     new_items = []
     skipped_expired = 0
+    try:
+        last = seen.get(url) or SourceState()
+        page = await fetch_page_async(session, url, last)
+
+        # 304: o servidor confirmou que a página não mudou desde a última execução
+        if page is None:
+            return new_items, skipped_expired
+
+        html, page_fingerprint, validators = page
+
+        # Se página não mudou (byte a byte), pula (guardando ETag/Last-Modified pra próxima vez)
+        if last.fingerprint == page_fingerprint:
+            seen[url] = replace(last, **validators)
+            return new_items, skipped_expired
+
+        links = extract_links(html, url)
+        anchor_fp = anchors_fingerprint(links)
+
+        # Se só mudou o "ruído" da página e os links são os mesmos, pula
+        if last.anchor_fp == anchor_fp:
+            seen[url] = replace(
+                last,
+                **validators,
+                fingerprint=page_fingerprint,
+                checked_at=datetime.now(timezone.utc).isoformat(),
+            )
+            return new_items, skipped_expired
+
+        candidates = [(t, h) for (t, h) in links if KEYWORDS_RX.search(t) or KEYWORDS_RX.search(h)]
+        if not candidates:
+            candidates = links[:10]
+
+        candidates_sig = sha(json.dumps(candidates, ensure_ascii=False))
+        last_sig = last.candidates_sig
+
+        # Se houve mudança nos candidatos, avaliamos os links (baixados em paralelo)
+        if last_sig != candidates_sig:
+            # Mesmo link pode aparecer várias vezes (menus repetidos): baixa cada URL uma vez só
+            seen_h = set()
+            selected = []
+            for (t, h) in candidates:
+                if h not in seen_h:
+                    seen_h.add(h)
+                    selected.append((t, h))
+            selected = selected[:8]
+            detail_htmls = await asyncio.gather(
+                *[fetch_detail(session, h, sem, domain_sems) for _, h in selected],
+                return_exceptions=True,
+            )
+            for (t, h), detail_html in zip(selected, detail_htmls):
+                try:
+                    if isinstance(detail_html, BaseException):
+                        raise detail_html
+                    if detail_html is None:
+                        # PDF ou outro arquivo: não dá pra ler o prazo, avisa pra conferir manualmente
+                        new_items.append(Item(name, f"{t} (⚠️ sem prazo detectado)", h))
+                        continue
+                    # Parse único por página de detalhe; a árvore é reaproveitada pelos extratores
+                    detail_soup = BeautifulSoup(detail_html, HTML_PARSER)
+                    detail_text = clean_text_from_soup(detail_soup)
+                    deadline = pick_deadline(detail_text)
+
+                    if deadline and is_expired(deadline):
+                        skipped_expired += 1
+                        continue
+
+                    if deadline:
+                        new_items.append(Item(name, f"{t} (prazo: {deadline.strftime('%d/%m/%Y')})", h))
+                    else:
+                        new_items.append(Item(name, f"{t} (⚠️ sem prazo detectado)", h))
+
+                except Exception as e:
+                    # Se não conseguir abrir a página do item, ainda avisa (pra você decidir manualmente)
+                    new_items.append(Item(name, f"{t} (⚠️ erro ao ler detalhes)", f"{h} | {type(e).__name__}: {e}"))
+
+        # Atualiza estado da fonte
+        seen[url] = SourceState(
+            fingerprint=page_fingerprint,
+            anchor_fp=anchor_fp,
+            candidates_sig=candidates_sig,
+            checked_at=datetime.now(timezone.utc).isoformat(),
+            **validators,
+        )
 
-    # Checa fontes (páginas principais)
-    for s in sources:
-        name = s["name"]
-        url = s["url"]
-        try:
-            html = fetch_page(url)
-            page_fingerprint = sha(html)
-            last_fp = seen.get(url, {}).get("fingerprint")
-
-            # Se página não mudou, pula
-            if last_fp == page_fingerprint:
-                continue
-
-            links = extract_links(html, url)
-
-            keywords = ["edital", "chamamento", "seleção", "oportunidade", "retificação", "prorrogação", "inscrição", "inscrições"]
-            candidates = [
-                (t, h) for (t, h) in links
-                if any(k in t.lower() for k in keywords) or any(k in h.lower() for k in keywords)
-            ]
-            if not candidates:
-                candidates = links[:10]
+    except Exception as e:
+        new_items.append(Item(name, "⚠️ Erro ao verificar fonte", f"{url} | {type(e).__name__}: {e}"))
 
-            candidates_sig = sha(json.dumps(candidates, ensure_ascii=False))
-            last_sig = seen.get(url, {}).get("candidates_sig")
+    return new_items, skipped_expired
 
-            # Se houve mudança nos candidatos, avaliamos os links
-            if last_sig != candidates_sig:
-                for (t, h) in candidates[:8]:
-                    try:
-                        detail_html = fetch_page(h)
-                        detail_text = clean_text_from_html(detail_html)
-                        deadline = pick_deadline(detail_text)
 
-                        if deadline and is_expired(deadline):
-                            skipped_expired += 1
-                            continue
+async def main():
+    sources = load_sources()
+    # I/O de arquivo em thread separada pra não travar o event loop
+    state = await asyncio.to_thread(load_state)
+    seen = state.get("seen", {})
 
-                        if deadline:
-                            new_items.append((name, f"{t} (prazo: {deadline.strftime('%d/%m/%Y')})", h))
-                        else:
-                            new_items.append((name, f"{t} (⚠️ sem prazo detectado)", h))
+    new_items = []
+    skipped_expired = 0
 
-                    except Exception as e:
-                        # Se não conseguir abrir a página do item, ainda avisa (pra você decidir manualmente)
-                        new_items.append((name, f"{t} (⚠️ erro ao ler detalhes)", f"{h} | {type(e).__name__}: {e}"))
+    sem = asyncio.Semaphore(DETAIL_CONCURRENCY)
+    domain_sems = {}
 
-            # Atualiza estado da fonte
-            seen[url] = {
-                "fingerprint": page_fingerprint,
-                "candidates_sig": candidates_sig,
-                "checked_at": datetime.now(timezone.utc).isoformat()
-            }
+    # Checa todas as fontes em paralelo (a ordem dos resultados segue sources.json)
+    async with aiohttp.ClientSession(
+        headers=HEADERS, timeout=aiohttp.ClientTimeout(total=30)
+    ) as session:
+        results = await asyncio.gather(
+            *[check_source(session, s, seen, sem, domain_sems) for s in sources]
+        )
 
-        except Exception as e:
-            new_items.append((name, "⚠️ Erro ao verificar fonte", f"{url} | {type(e).__name__}: {e}"))
+        for items, skipped in results:
+            new_items.extend(items)
+            skipped_expired += skipped
 
-    state["seen"] = seen
-    save_state(state)
+        state["seen"] = seen
+        await asyncio.to_thread(save_state, state)
 
-    now = datetime.now().strftime("%d/%m/%Y %H:%M")
+        now = datetime.now().strftime("%d/%m/%Y %H:%M")
 
-    if new_items:
-        msg_lines = [f"🔎 Novidades detectadas ({now})", ""]
-        for (src, title, link) in new_items[:20]:
-            msg_lines.append(f"• {src}: {title}\n  {link}")
+        if new_items:
+            msg_lines = [f"🔎 Novidades detectadas ({now})", ""]
+            for item in new_items[:20]:
+                msg_lines.append(f"• {item.source}: {item.title}\n  {item.link}")
 
-        if skipped_expired:
-            msg_lines.append("")
-            msg_lines.append(f"🧹 Filtrados por prazo vencido: {skipped_expired}")
+            if skipped_expired:
+                msg_lines.append("")
+                msg_lines.append(f"🧹 Filtrados por prazo vencido: {skipped_expired}")
 
-        tg_send("\n".join(msg_lines))
-    else:
-        # Mensagem “prova de vida” (como você gosta)
-        extra = f" | filtrados vencidos: {skipped_expired}" if skipped_expired else ""
-        tg_send(f"✅ Monitor rodou ({now}) e não encontrou novidades nas fontes.{extra}")
+            await tg_send(session, "\n".join(msg_lines))
+        else:
+            # Mensagem “prova de vida” (como você gosta)
+            extra = f" | filtrados vencidos: {skipped_expired}" if skipped_expired else ""
+            await tg_send(session, f"✅ Monitor rodou ({now}) e não encontrou novidades nas fontes.{extra}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())